@@ -3,6 +3,7 @@ from functools import reduce
 from logging import getLogger
 from typing import List, Sequence, Tuple, TypeVar, Union
 
+from numba import njit, prange
 import numpy as np
 import pandas as pd
 
@@ -77,6 +78,26 @@ def _isgrouped(scenario: str) -> bool:
     return isinstance(baselines[scenario], list)
 
 
+def _pin(scenario: str) -> Tuple[Tuple[str, ...], Tuple]:
+    """Scenarios pinned to their baselines when marginalising `scenario`, and
+    the baseline values of the remaining (unpinned) scenarios
+
+    """
+    pins = (
+        tuple(baselines[scenario])
+        if _isgrouped(scenario)
+        else tuple(sc for sc in baselines if sc != scenario and not _isgrouped(sc))
+    )
+    unpinned = tuple(
+        baselines[sc] for sc in baselines if sc not in pins and not _isgrouped(sc)
+    )
+    return pins, unpinned
+
+
+# invariant for a scenario, computed once instead of on every `marginalise`
+_pins = {sc: _pin(sc) for sc in baselines}
+
+
 def qsum(data: Sequence) -> float:
     """Add in quadrature, typically uncertainties
 
@@ -84,8 +105,14 @@ def qsum(data: Sequence) -> float:
 
     \\sqrt{\\sum_{i=1}^{n} x^2_i}
 
+    NaNs are ignored, like :meth:`pandas.Series.sum`.
+
     """
-    return np.sqrt(np.square(data).sum())
+    values = np.asarray(data, dtype=np.float64)
+    norm = np.linalg.norm(values)  # one fused reduction, no squared temporary
+    if np.isnan(norm):
+        norm = np.linalg.norm(values[~np.isnan(values)])
+    return float(norm)
 
 
 DFSeries_t = TypeVar("DFSeries_t", pd.DataFrame, pd.Series)
@@ -116,10 +143,20 @@ def lvl_filter(
         The filtered dataframe/series
 
     """
-    if reverse:
-        sel = df.index.get_level_values(lvl).str.endswith(token)
+
+    def _match(values: pd.Index) -> np.ndarray:
+        if reverse:
+            return np.asarray(values.str.endswith(token), dtype=bool)
+        else:
+            return np.asarray(values.str.startswith(token), dtype=bool)
+
+    if isinstance(df.index, pd.MultiIndex):
+        # match the unique values once, and map on to the rows using the level
+        # codes; the appended element is picked by missing values (code: -1)
+        pos = df.index.names.index(lvl)
+        sel = np.append(_match(df.index.levels[pos]), False)[df.index.codes[pos]]
     else:
-        sel = df.index.get_level_values(lvl).str.startswith(token)
+        sel = _match(df.index.get_level_values(lvl))
     return df[~sel if invert else sel]
 
 
@@ -233,6 +270,29 @@ def sort_by_col(df: pd.DataFrame, scenario: str) -> pd.DataFrame:
     return df
 
 
+@njit(parallel=True)
+def _deltas(values: np.ndarray, ref: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Row-wise absolute deviation of the minimum & maximum from column `ref`
+
+    NaNs are skipped, like :meth:`pandas.DataFrame.min`/`max`.
+
+    """
+    nrows, ncols = values.shape
+    errlo = np.empty(nrows)
+    errhi = np.empty(nrows)
+    for i in prange(nrows):
+        lo, hi = np.inf, -np.inf
+        for j in range(ncols):
+            val = values[i, j]
+            if val < lo:
+                lo = val
+            if val > hi:
+                hi = val
+        errlo[i] = abs(lo - values[i, ref])
+        errhi[i] = abs(hi - values[i, ref])
+    return errlo, errhi
+
+
 def marginalise(arr: pd.Series, scenario: str) -> Union[pd.DataFrame, pd.Series]:
     """Marginalise all scenarios except the one specified.
 
@@ -261,30 +321,23 @@ def marginalise(arr: pd.Series, scenario: str) -> Union[pd.DataFrame, pd.Series]
         raise ValueError(f"unknown {scenario=}: must be one of {list(baselines)}")
 
     # pin other scenarios
-    pins = (
-        [sc for sc in baselines[scenario]]
-        if _isgrouped(scenario)
-        else [sc for sc in baselines if sc != scenario and not _isgrouped(sc)]
-    )
+    pins, unpinned = _pins[scenario]
     if pins:
-        query = [f"{sc} == {baselines[sc]!r}" for sc in pins]
-        df = df.query(" & ".join(query))
+        mask = np.logical_and.reduce(
+            [df.index.get_level_values(sc) == baselines[sc] for sc in pins]
+        )
+        df = df[mask]
         df.index = df.index.droplevel(pins)
 
-    unpinned = [
-        baselines[sc] for sc in baselines if sc not in pins and not _isgrouped(sc)
-    ]
     df = df.unstack(list(range(len(unpinned))))
-    baseline = df[(colname, *unpinned) if unpinned else colname]
-    names = [colname, "errlo", "errhi"]
+    key = (colname, *unpinned) if unpinned else colname
+    baseline = df[key]
     if df.ndim > 1:
-        deltas = [(df.apply(f, axis=1) - baseline).abs() for f in (np.min, np.max)]
-        df = pd.concat([baseline, *deltas], axis=1)
-        df.columns = names
-        return df
+        errlo, errhi = _deltas(df.to_numpy(dtype=np.float64), df.columns.get_loc(key))
+        return pd.DataFrame({colname: baseline, "errlo": errlo, "errhi": errhi})
     else:  # series
-        deltas = [np.abs(f(df) - baseline) for f in (np.min, np.max)]
-        return pd.Series([baseline, *deltas], index=names)
+        deltas = [np.abs(df.min() - baseline), np.abs(df.max() - baseline)]
+        return pd.Series([baseline, *deltas], index=[colname, "errlo", "errhi"])
 
 
 def scenario_deltas(arr: pd.Series, istransmission: bool = False) -> pd.DataFrame:
@@ -314,24 +367,34 @@ def scenario_deltas(arr: pd.Series, istransmission: bool = False) -> pd.DataFram
 
     # FIXME: instead of iterating, could do it by generating the right indices
     # in marginalise
-    arrays = []
-    for scenario in baselines:
-        _df = marginalise(arr, scenario)
-        if isinstance(_df, pd.DataFrame):
-            null = _df.apply(lambda row: np.isclose(row, 0).all(), axis=1)
-            _df = (
-                _df[~null].assign(scenario=scenario).set_index("scenario", append=True)
-            )
-        else:  # series
-            _df = pd.DataFrame([_df], index=pd.Index([scenario], name="scenario"))
-        arrays.append(_df)
-    df = pd.concat(arrays, axis=0)
+    results = [marginalise(arr, scenario) for scenario in baselines]
+    if isinstance(results[0], pd.Series):  # one row per scenario
+        df = pd.DataFrame(results, index=pd.Index(list(baselines), name="scenario"))
+    else:
+        # drop rows that are ~0; the remainder is stacked in one go, with the
+        # scenario level appended in the order of `baselines`
+        frames = [_df[~np.isclose(_df.to_numpy(), 0).all(axis=1)] for _df in results]
+        nrows = [len(_df) for _df in frames]
+        idx = pd.MultiIndex.from_arrays(
+            [
+                np.concatenate([_df.index.get_level_values(i) for _df in frames])
+                for i in range(frames[0].index.nlevels)
+            ],
+            names=frames[0].index.names,
+        )
+        idx = pd.MultiIndex(
+            levels=[*idx.levels, list(baselines)],
+            codes=[*idx.codes, np.repeat(np.arange(len(baselines)), nrows)],
+            names=[*idx.names, "scenario"],
+        )
+        df = pd.DataFrame(
+            np.concatenate([_df.to_numpy() for _df in frames]),
+            index=idx,
+            columns=frames[0].columns,
+        )
     if df.empty:
         raise RuntimeError(f"{arr.name}, {istransmission=}: empty dataframe, ~0")
-    if isinstance(df.index, pd.MultiIndex):
-        return df.reindex(index=list(baselines), level="scenario")
-    else:
-        return df.reindex(index=list(baselines))
+    return df
 
 
 def delta_prop(df: pd.DataFrame, prop: bool = False, sfx: str = "") -> pd.Series:
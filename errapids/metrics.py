@@ -1,9 +1,8 @@
-from itertools import chain
+from functools import lru_cache, reduce
 from pathlib import Path
 from textwrap import indent
 from typing import Iterable, Dict, Literal, List, Tuple, Union, overload
 
-from glom import glom, Iter
 import numpy as np
 import pandas as pd
 import xarray as xr
@@ -74,6 +73,7 @@ def decode_link(_idx: pd.Index):
     return idx, transport
 
 
+@lru_cache(maxsize=None)
 def prettify_costs(name: str, pretty: bool) -> Union[str, int]:
     factor = pv_batt_lvls[int(name[-1]) - 1]
     if pretty:
@@ -82,6 +82,16 @@ def prettify_costs(name: str, pretty: bool) -> Union[str, int]:
         return int(factor * 100)
 
 
+def open_result(fpath: _path_t) -> xr.Dataset:
+    """Lazily open a model result from a NetCDF file
+
+    Variables are backed by dask arrays chunked as stored on disk, so
+    reductions read one on-disk chunk at a time.
+
+    """
+    return xr.open_dataset(fpath, chunks={})
+
+
 def ensure_frame(data: Union[pd.Series, pd.DataFrame]) -> pd.DataFrame:
     if isinstance(data, pd.Series):
         return data.to_frame()
@@ -114,7 +124,7 @@ class Metrics:
     @classmethod
     def from_netcdf(cls, fpath: _path_t) -> "Metrics":
         """Read the saved model result from a NetCDF file"""
-        return cls(xr.open_dataset(fpath))
+        return cls(open_result(fpath))
 
     def is_tseries(self, metric: str) -> bool:
         return "timesteps" in getattr(self._dst, metric).coords
@@ -122,12 +132,17 @@ class Metrics:
     def __init__(self, dst: xr.Dataset):
         self._dst = dst.filter_by_attrs(is_result=1)
         self.time_varying = [v for v in self._dst.data_vars if self.is_tseries(v)]
+        self._cache: Dict[str, pd.Series] = {}
 
     def __repr__(self) -> str:
         return repr(self._dst)
 
     def __getitem__(self, metric: str) -> pd.Series:
-        return self.get(metric, summarise=True)
+        """Summarised metric, parsed once and cached"""
+        if metric not in self._cache:
+            self._cache[metric] = self.get(metric, summarise=True)
+        # callers reassign the index, a shallow copy keeps the cache intact
+        return self._cache[metric].copy(deep=False)
 
     @overload
     def get(self, metric: str, summarise: Literal[True]) -> pd.Series:
@@ -142,6 +157,9 @@ class Metrics:
         darr = self._dst[metric]
         if "costs" in darr.dims:  # costs: redundant, usually only monetary
             darr = darr.sel(costs="monetary")
+        if summarise and "timesteps" in darr.dims:
+            # aggregate before loading, reduces chunk-wise when dask backed
+            darr = darr.mean(dim="timesteps")
         arr = darr.to_pandas()  # series or dataframe (when timeseries)
         # when timeseries, "wide" format, i.e. timesteps as columns
 
@@ -149,8 +167,6 @@ class Metrics:
             arr = arr.stack()  # dataframe -> series
 
         if summarise:
-            if arr.ndim == 2:  # timesteps: aggregated
-                arr = arr.mean(axis=1)  # dataframe -> series
             assert arr.ndim == 1
 
         # factors of interest: location, technology, [carrier]
@@ -181,18 +197,15 @@ class Metrics:
         # index name: loc_techs_*, loc_tech_carriers_*
         if "loc_tech" not in _idx.name:
             raise ValueError(msg)
-        idx = _idx.str.split("::", expand=True)
         if "carrier" in _idx.name:
-            if idx.nlevels == 3:
-                idx.names = ["region", "technology", "carrier"]
-            else:
-                raise ValueError(msg)
+            names = ["region", "technology", "carrier"]
         else:
-            if idx.nlevels == 2:
-                idx.names = ["region", "technology"]
-            else:
-                raise ValueError(msg)
-        return idx
+            names = ["region", "technology"]
+        # split in Python, avoids the intermediate frame of `str.split(expand=True)`
+        values = [value.split("::") for value in _idx]
+        if any(len(value) != len(names) for value in values):
+            raise ValueError(msg)
+        return pd.MultiIndex.from_arrays(list(zip(*values)), names=names)
 
 
 class ScenarioGroups:
@@ -208,7 +221,9 @@ class ScenarioGroups:
 
     @classmethod
     def from_netcdfs(cls, fpaths: Iterable[_path_t], **kwargs) -> "ScenarioGroups":
-        return cls(map(xr.open_dataset, fpaths), **kwargs)
+        # variables are lazy dask arrays, only the metrics that are accessed
+        # are ever read from disk
+        return cls(map(open_result, fpaths), **kwargs)
 
     @classmethod
     def __unpack_overrides__(cls, overrides: str, pretty: bool) -> Tuple:
@@ -247,17 +262,11 @@ class ScenarioGroups:
             )
             for dst in scenarios
         }
-        self.varnames = glom(
-            self._scenarios.values(),
-            (
-                Iter("1._dst.data_vars").first(),
-                list,
-                Iter().filter(lambda v: v not in self._banned).all(),
-            ),
-        )
-        dst = glom(self._scenarios.values(), Iter("1").first())
-        self.varnames_ts = [var for var in self.varnames if dst.is_tseries(var)]
+        first = next(iter(self._scenarios.values()))[1]
+        self.varnames = [v for v in first._dst.data_vars if v not in self._banned]
+        self.varnames_ts = [var for var in self.varnames if first.is_tseries(var)]
         self.metrics = self.varnames + self.derived
+        self._cache: Dict[str, pd.Series] = {}
 
     def __repr__(self) -> str:
         return "\n---\n".join(
@@ -265,29 +274,50 @@ class ScenarioGroups:
         )
 
     def __getitem__(self, metric: str) -> pd.Series:
-        if metric in self.varnames:
-            return self.get(metric, summarise=True)[metric]
-        elif metric in self.derived:
-            return self.derive(metric, summarise=True)[metric]
-        else:
-            raise KeyError(f"{metric}: unknown metric")
+        if metric not in self._cache:
+            if metric in self.varnames:
+                self._cache[metric] = self.get(metric, summarise=True)[metric]
+            elif metric in self.derived:
+                self._cache[metric] = self.derive(metric, summarise=True)[metric]
+            else:
+                raise KeyError(f"{metric}: unknown metric")
+        # callers reassign the index, a shallow copy keeps the cache intact
+        return self._cache[metric].copy(deep=False)
 
     def get(self, metric: str, summarise: bool) -> pd.DataFrame:
         if metric in self._banned:
             raise ValueError(f"{metric}: derived metric, use `derive(..)`")
-        df = pd.concat(
-            [
-                ensure_frame(metrics.get(metric, summarise)).assign(
-                    **{col: lvl for col, lvl in zip(self.idxcols, lvls)}
+        lvls, frames = [], []
+        for _lvls, metrics in self._scenarios.values():
+            lvls.append(_lvls)
+            frames.append(
+                ensure_frame(
+                    metrics[metric] if summarise else metrics.get(metric, summarise)
                 )
-                for lvls, metrics in self._scenarios.values()
-            ],
-            axis=0,
-        ).set_index(self.idxcols, append=True)
-        nlvls = df.index.nlevels
-        # 4 levels of scenarios: heating, EV, PV, battery; move them forward
-        new_order = list(chain(range(nlvls)[-4:], range(nlvls)[:-4]))
-        return df.reorder_levels(new_order)
+            )
+        columns = frames[0].columns
+        if not all(df.columns.equals(columns) for df in frames):
+            # align on labels (e.g. timesteps), like `pd.concat`
+            columns = reduce(
+                lambda i, j: i.union(j, sort=False), (df.columns for df in frames)
+            )
+            frames = [df.reindex(columns=columns) for df in frames]
+        # 4 levels of scenarios: heating, EV, PV, battery; in front, repeated
+        # for every row of the scenario
+        nrows = [len(df) for df in frames]
+        outer = [np.repeat(np.array(lvl), nrows) for lvl in zip(*lvls)]
+        inner = [
+            np.concatenate([df.index.get_level_values(i) for df in frames])
+            for i in range(frames[0].index.nlevels)
+        ]
+        idx = pd.MultiIndex.from_arrays(
+            [*outer, *inner], names=[*self.idxcols, *frames[0].index.names]
+        )
+        return pd.DataFrame(
+            np.concatenate([df.to_numpy() for df in frames]),
+            index=idx,
+            columns=columns,
+        )
 
     def derive(self, metric: str, summarise: bool = True) -> pd.DataFrame:
         if metric == "carrier_prod_share":
@@ -311,9 +341,8 @@ def technology_share(arr: pd.Series) -> pd.Series:
     _lvl = arr.index.names.index("technology")
     # sum over any deeper levels
     numerator = arr.groupby(level=list(range(_lvl + 1))).sum()
-    # sum over desired level to get reference
-    denominator = arr.groupby(level=list(range(_lvl))).sum()
-    numerator, denominator = numerator.align(denominator, method="ffill")
+    # sum over desired level to get reference, broadcast to the numerator
+    denominator = numerator.groupby(level=list(range(_lvl))).transform("sum")
     return numerator / denominator
 
 
@@ -1,6 +1,9 @@
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from itertools import product, chain
-from typing import List, Tuple, cast
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, cast
 
 import numpy as np
 import pandas as pd
@@ -48,12 +51,13 @@ def facets1(df: pd.DataFrame, facet: str):
         ref = hv.HLine(df.iloc[0, 0])
         plots.append((err * ref).opts(**opts))
     else:
+        grouped = dict(iter(df.groupby(level=facet)))
         for key in df.index.levels[df.index.names.index(facet)]:
-            _df = df.query(f"{facet} == '{key}'")
-            if _df.empty:
+            if key not in grouped:
                 continue
+            _df = grouped[key]
             err = hv.Spread(_df, vdims=list(df.columns), kdims=["scenario"])
-            ref = hv.HLine(_df.query("scenario == 'all'").iloc[0, 0])
+            ref = hv.HLine(_df.xs("all", level="scenario").iloc[0, 0])
             plots.append((err * ref).opts(**opts, title=_title(key)))
     plots.append(hv.Table(df.reset_index()))
     return plots
@@ -74,12 +78,9 @@ def facets2(df: pd.DataFrame, facets: List[str]):
         _title = lambda k: k
 
     plots = []
-    for region, tech_grp in (
-        df.index.droplevel(df.index.names.difference(facets)).unique().to_flat_index()
-    ):
-        _df = df.query(f"{facets[0]} == '{region}' & {facets[1]} == '{tech_grp}'")
+    for (region, tech_grp), _df in df.groupby(level=facets, sort=False):
         err = hv.Spread(_df, vdims=list(df.columns), kdims=["scenario"])
-        ref = hv.HLine(_df.query("scenario == 'all'").iloc[0, 0])
+        ref = hv.HLine(_df.xs("all", level="scenario").iloc[0, 0])
         plots.append((err * ref).opts(**opts, title=f"{_title(region)} - {tech_grp}"))
     plots.append(hv.Table(df.reset_index()))
     return plots
@@ -115,10 +116,10 @@ def barchart(df: pd.DataFrame, sumover: str):
             )
         ]
 
-    # order matters
+    # order matters: rotate, such that `sumover` is last
     kdims = ["region", "technology"]
-    if 0 == kdims.index(sumover):  # cycle order
-        kdims.reverse()
+    pos = kdims.index(sumover) + 1
+    kdims = kdims[pos:] + kdims[:pos]
 
     if sumover == "technology":
         plots = []
@@ -161,6 +162,7 @@ class plotmanager:
 
     def __init__(self, data):
         self._data = data
+        self.derived = self._data.derived
         self._arrays = {}
         self._trans = {}
         for name in self._data.metrics:
@@ -194,7 +196,7 @@ class plotmanager:
 
     @property
     def metrics(self):
-        return list(self._arrays) + self._data.derived
+        return list(self._arrays) + self.derived
 
     @property
     def regions(self) -> List[str]:
@@ -261,7 +263,7 @@ class plotmanager:
         return bands
 
     def agg(self, metric: str, sumover: str, region_grp: str):
-        if metric in self._data.derived:
+        if metric in self.derived:
             raise ValueError(f"{metric}: derived metric, cannot draw aggregated plot")
 
         if "total" in metric or "systemwide" in metric:
@@ -288,37 +290,31 @@ class plotmanager:
             .cols(ncols)
         )
 
-    def write(self, plotdir: str):
+    def write(self, plotdir: str, max_workers: Optional[int] = None):
         """Write all plots to a directory
 
+        The plots are rendered and written in parallel by a pool of worker
+        processes, except the derived metrics, which need the model data.
+
         Parameters
         ----------
         plotdir : str
             Plot directory
 
+        max_workers : int (default: None)
+            Number of worker processes, defaults to the number of processors
+
         """
-        pbar1 = tqdm(self.metrics)
-        for metric in pbar1:
-            pbar1.set_description(f"{metric}")
+        tasks = []  # (file, method, args, ncols)
+        for metric in self.metrics:
             if "total" in metric or "systemwide" in metric:
-                plot = self.render(self.agg(metric, "", ""))
-                hv.save(plot, f"{plotdir}/{metric}.html")
-            elif metric in self._data.derived:
-                if metric == "capacity_factor":
-                    for sumover in ("region", "technology"):
-                        plot = self.render(self.agg_capacity_factor(sumover))
-                        hv.save(plot, f"{plotdir}/{metric}_{sumover}.html")
-                elif metric == "carrier_prod_share":
-                    plot = self.render(self.agg_carrier_prod_share())
-                    hv.save(plot, f"{plotdir}/{metric}.html")
-                else:
-                    RuntimeError("don't know how it got here")
+                tasks.append((f"{plotdir}/{metric}.html", "agg", (metric, "", ""), 3))
+            elif metric in self.derived:
+                continue
             else:
-                pbar2 = tqdm(rgroups)
-                for lvl, grp in product(("region", "technology"), pbar2):
-                    pbar2.set_description(f"{grp=}")
-                    plot = self.render(self.agg(metric, lvl, grp))
-                    hv.save(plot, f"{plotdir}/{metric}_{grp}_{lvl}.html")
+                for lvl, grp in product(("region", "technology"), rgroups):
+                    fname = f"{plotdir}/{metric}_{grp}_{lvl}.html"
+                    tasks.append((fname, "agg", (metric, lvl, grp), 3))
 
         for _scenarios in (
             ["heating", "EV"],
@@ -326,17 +322,76 @@ class plotmanager:
             ["demand", "cost", "all"],
         ):
             tag = "_".join(_scenarios)
-            delta_plots = self.regionwise_bands(_scenarios)
-            hv.save(
-                self.render(delta_plots, ncols=2),
-                f"{plotdir}/scenario_group_delta_{tag}.html",
-            )
-            delta_plots = self.regionwise_bands(_scenarios, transmission=True)
-            hv.save(
-                self.render(delta_plots, ncols=2),
-                f"{plotdir}/scenario_group_delta_{tag}_transmission.html",
+            fname = f"{plotdir}/scenario_group_delta_{tag}"
+            tasks.append((f"{fname}.html", "regionwise_bands", (_scenarios,), 2))
+            tasks.append(
+                (
+                    f"{fname}_transmission.html",
+                    "regionwise_bands",
+                    (_scenarios, True),
+                    2,
+                )
             )
 
+        # spawn: forking isn't safe once dask, numba or HDF5 have started
+        # their thread pools; workers only get the precomputed arrays, the
+        # model data isn't needed (and an open HDF5 store can't be pickled)
+        with ProcessPoolExecutor(
+            max_workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(
+                self._arrays,
+                self._trans,
+                self.derived,
+                hv.Store.current_backend,
+            ),
+        ) as pool, tqdm(total=len(tasks)) as pbar:
+            futures = [pool.submit(_write_plot, *task) for task in tasks]
+            for future in futures:
+                future.add_done_callback(lambda _: pbar.update())
+
+            # derived metrics: rendered here, while the workers are busy
+            for metric in self.derived:
+                if metric == "capacity_factor":
+                    for sumover in ("region", "technology"):
+                        plot = self.render(self.agg_capacity_factor(sumover))
+                        hv.save(
+                            plot,
+                            f"{plotdir}/{metric}_{sumover}.html",
+                            resources="cdn",
+                        )
+                elif metric == "carrier_prod_share":
+                    plot = self.render(self.agg_carrier_prod_share())
+                    hv.save(plot, f"{plotdir}/{metric}.html", resources="cdn")
+                else:
+                    raise RuntimeError("don't know how it got here")
+
+            for future in as_completed(futures):
+                pbar.set_description(Path(future.result()).stem)
+
+
+_mgr: plotmanager
+
+
+def _init_worker(arrays: Dict, trans: Dict, derived: List[str], backend: str):
+    """Build a :class:`plotmanager` without model data in a worker process"""
+    global _mgr
+    _mgr = plotmanager.__new__(plotmanager)
+    _mgr._arrays = arrays
+    _mgr._trans = trans
+    _mgr.derived = derived
+    if backend not in hv.Store.renderers:
+        hv.extension(backend)
+
+
+def _write_plot(fpath: str, method: str, args: Tuple, ncols: int) -> str:
+    """Render a plot with the worker's :class:`plotmanager`, and write it"""
+    plot = _mgr.render(getattr(_mgr, method)(*args), ncols=ncols)
+    # BokehJS is loaded from the CDN, instead of being embedded in every file
+    hv.save(plot, fpath, resources="cdn")
+    return fpath
+
 
 def scenario_heatmap(
     arr: pd.Series, facetx, scenariox, scenarioy, title: str = "", write: str = ""
@@ -533,9 +588,14 @@ class trendmanager:
             hv.save(
                 hv.Layout(plot).cols(1),
                 f"{plotdir}/electricity_{region}_{self.legend(export)}_{lvl}.html",
+                resources="cdn",
             )
 
         pbar = tqdm(plots2.items())
         for region, plot in pbar:
             pbar.set_description(f"Writing file:{region=}")
-            hv.save(hv.Layout(plot).cols(1), f"{plotdir}/elec_var_{region}_{lvl}.html")
+            hv.save(
+                hv.Layout(plot).cols(1),
+                f"{plotdir}/elec_var_{region}_{lvl}.html",
+                resources="cdn",
+            )